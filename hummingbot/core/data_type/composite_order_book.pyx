@@ -3,6 +3,8 @@
 
 from typing import Iterator
 
+import numpy as np
+
 from cython.operator cimport address as ref, dereference as deref, postincrement as inc
 from hummingbot.core.data_type.OrderBookEntry cimport OrderBookEntry
 from libcpp.set cimport set
@@ -28,6 +30,7 @@ cdef class CompositeOrderBook(OrderBook):
     def clear_traded_order_book(self):
         self._traded_order_book._bid_book.clear()
         self._traded_order_book._ask_book.clear()
+        self.c_invalidate_depth_index()
 
     def record_filled_order(self, order_fill_event):
         cdef:
@@ -71,6 +74,23 @@ cdef class CompositeOrderBook(OrderBook):
             cpp_bids.push_back(OrderBookEntry(price, amount, timestamp))
 
         self._traded_order_book.c_apply_diffs(cpp_bids, cpp_asks, timestamp)
+        self.c_invalidate_depth_index()
+
+    cdef c_rebuild_depth_index(self):
+        # The depth index has to reflect the composite entries (original book minus the recorded fills)
+        self._bid_depth_index = self._depth_index_from_rows(list(self.bid_entries()))
+        self._ask_depth_index = self._depth_index_from_rows(list(self.ask_entries()))
+        self._depth_index_valid = True
+
+    @staticmethod
+    def _depth_index_from_rows(rows) -> np.ndarray:
+        rows_array = np.array(rows, dtype=np.float64).reshape(-1, 3)
+        depth = np.empty((4, rows_array.shape[0]), dtype=np.float64)
+        depth[0] = rows_array[:, 0]
+        depth[1] = rows_array[:, 1]
+        np.cumsum(depth[1], out=depth[2])
+        np.cumsum(depth[0] * depth[1], out=depth[3])
+        return depth
 
     def original_bid_entries(self) -> Iterator[OrderBookRow]:
         return super().bid_entries()
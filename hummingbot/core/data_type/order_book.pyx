@@ -36,6 +36,58 @@ cimport numpy as np
 ob_logger = None
 NaN = float("nan")
 
+# Row layout of the columnar depth index, see OrderBook.bid_depth_index / OrderBook.ask_depth_index
+cdef enum:
+    DEPTH_PRICE = 0
+    DEPTH_AMOUNT = 1
+    DEPTH_CUMULATIVE_AMOUNT = 2
+    DEPTH_CUMULATIVE_QUOTE = 3
+    DEPTH_INDEX_ROWS = 4
+
+
+cdef inline Py_ssize_t c_first_level_reaching(double[:, ::1] depth, int row, double target):
+    """
+    Binary search for the first level whose cumulative value (on the given row) is >= target.
+    Returns the number of levels if the target is never reached.
+    """
+    cdef:
+        Py_ssize_t low = 0
+        Py_ssize_t high = depth.shape[1]
+        Py_ssize_t mid
+    if target != target:
+        # NaN targets are never reached
+        return high
+    while low < high:
+        mid = (low + high) >> 1
+        if depth[row, mid] >= target:
+            high = mid
+        else:
+            low = mid + 1
+    return low
+
+
+cdef inline Py_ssize_t c_count_levels_within_price(double[:, ::1] depth, bint is_buy, double price):
+    """
+    Binary search for the number of levels priced at or better than the given price. Asks are sorted ascending and
+    bids descending, so the levels within the price always form a prefix.
+    """
+    cdef:
+        Py_ssize_t low = 0
+        Py_ssize_t high = depth.shape[1]
+        Py_ssize_t mid
+        double level_price
+    if price != price:
+        # Comparisons against NaN never stop the book walk, so every level is within the price
+        return high
+    while low < high:
+        mid = (low + high) >> 1
+        level_price = depth[DEPTH_PRICE, mid]
+        if (level_price <= price) if is_buy else (level_price >= price):
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
 
 cdef class OrderBook(PubSub):
     ORDER_BOOK_TRADE_EVENT_TAG = OrderBookEvent.TradeEvent.value
@@ -56,6 +108,7 @@ cdef class OrderBook(PubSub):
         self._last_applied_trade = -1000.0
         self._last_trade_price_rest_updated = -1000
         self._dex = dex
+        self._depth_index_valid = False
 
     cdef c_apply_diffs(self, vector[OrderBookEntry] bids, vector[OrderBookEntry] asks, int64_t update_id):
         cdef:
@@ -96,6 +149,7 @@ cdef class OrderBook(PubSub):
 
         # Remember the last diff update ID.
         self._last_diff_uid = update_id
+        self.c_invalidate_depth_index()
 
     cdef c_apply_snapshot(self, vector[OrderBookEntry] bids, vector[OrderBookEntry] asks, int64_t update_id):
         cdef:
@@ -136,12 +190,84 @@ cdef class OrderBook(PubSub):
 
         # Remember the last snapshot update ID.
         self._snapshot_uid = update_id
+        self.c_invalidate_depth_index()
 
     cdef c_apply_trade(self, object trade_event):
         self._last_trade_price = trade_event.price
         self._last_applied_trade = time.perf_counter()
         self.c_trigger_event(self.ORDER_BOOK_TRADE_EVENT_TAG, trade_event)
 
+    cdef c_invalidate_depth_index(self):
+        self._depth_index_valid = False
+
+    cdef c_rebuild_depth_index(self):
+        cdef:
+            set[OrderBookEntry].reverse_iterator bid_it = self._bid_book.rbegin()
+            set[OrderBookEntry].iterator ask_it = self._ask_book.begin()
+            np.ndarray[np.float64_t, ndim=2] bid_depth = np.empty((DEPTH_INDEX_ROWS, self._bid_book.size()),
+                                                                   dtype=np.float64)
+            np.ndarray[np.float64_t, ndim=2] ask_depth = np.empty((DEPTH_INDEX_ROWS, self._ask_book.size()),
+                                                                   dtype=np.float64)
+            double cumulative_amount = 0
+            double cumulative_quote = 0
+            Py_ssize_t i = 0
+            OrderBookEntry entry
+
+        while bid_it != self._bid_book.rend():
+            entry = deref(bid_it)
+            cumulative_amount += entry.getAmount()
+            cumulative_quote += entry.getAmount() * entry.getPrice()
+            bid_depth[DEPTH_PRICE, i] = entry.getPrice()
+            bid_depth[DEPTH_AMOUNT, i] = entry.getAmount()
+            bid_depth[DEPTH_CUMULATIVE_AMOUNT, i] = cumulative_amount
+            bid_depth[DEPTH_CUMULATIVE_QUOTE, i] = cumulative_quote
+            inc(bid_it)
+            i += 1
+
+        cumulative_amount = cumulative_quote = 0
+        i = 0
+        while ask_it != self._ask_book.end():
+            entry = deref(ask_it)
+            cumulative_amount += entry.getAmount()
+            cumulative_quote += entry.getAmount() * entry.getPrice()
+            ask_depth[DEPTH_PRICE, i] = entry.getPrice()
+            ask_depth[DEPTH_AMOUNT, i] = entry.getAmount()
+            ask_depth[DEPTH_CUMULATIVE_AMOUNT, i] = cumulative_amount
+            ask_depth[DEPTH_CUMULATIVE_QUOTE, i] = cumulative_quote
+            inc(ask_it)
+            i += 1
+
+        self._bid_depth_index = bid_depth
+        self._ask_depth_index = ask_depth
+        self._depth_index_valid = True
+
+    cdef np.ndarray c_get_depth_index(self, bint is_buy):
+        if not self._depth_index_valid:
+            self.c_rebuild_depth_index()
+        return self._ask_depth_index if is_buy else self._bid_depth_index
+
+    @property
+    def bid_depth_index(self) -> np.ndarray:
+        """
+        Read-only columnar view of the bid side, best price first. The array has shape (4, levels) and its rows are
+        price, amount, cumulative amount and cumulative quote volume.
+
+        The index is rebuilt lazily after the book changes. Views returned before a change keep pointing to the
+        previous state of the book.
+        """
+        depth_view = self.c_get_depth_index(False).view()
+        depth_view.flags.writeable = False
+        return depth_view
+
+    @property
+    def ask_depth_index(self) -> np.ndarray:
+        """
+        Read-only columnar view of the ask side, best price first. See `bid_depth_index` for the layout.
+        """
+        depth_view = self.c_get_depth_index(True).view()
+        depth_view.flags.writeable = False
+        return depth_view
+
     @property
     def last_trade_price(self) -> float:
         return self._last_trade_price
@@ -321,140 +447,100 @@ cdef class OrderBook(PubSub):
 
     cdef OrderBookQueryResult c_get_price_for_volume(self, bint is_buy, double volume):
         cdef:
+            double[:, ::1] depth = self.c_get_depth_index(is_buy)
+            Py_ssize_t levels = depth.shape[1]
+            Py_ssize_t level = c_first_level_reaching(depth, DEPTH_CUMULATIVE_AMOUNT, volume)
             double cumulative_volume = 0
             double result_price = NaN
 
-        if is_buy:
-            for order_book_row in self.ask_entries():
-                cumulative_volume += order_book_row.amount
-                if cumulative_volume >= volume:
-                    result_price = order_book_row.price
-                    break
-        else:
-            for order_book_row in self.bid_entries():
-                cumulative_volume += order_book_row.amount
-                if cumulative_volume >= volume:
-                    result_price = order_book_row.price
-                    break
+        if level < levels:
+            result_price = depth[DEPTH_PRICE, level]
+            cumulative_volume = depth[DEPTH_CUMULATIVE_AMOUNT, level]
+        elif levels > 0:
+            cumulative_volume = depth[DEPTH_CUMULATIVE_AMOUNT, levels - 1]
 
         return OrderBookQueryResult(NaN, volume, result_price, min(cumulative_volume, volume))
 
     cdef OrderBookQueryResult c_get_vwap_for_volume(self, bint is_buy, double volume):
         cdef:
+            double[:, ::1] depth = self.c_get_depth_index(is_buy)
+            Py_ssize_t levels = depth.shape[1]
+            Py_ssize_t level = c_first_level_reaching(depth, DEPTH_CUMULATIVE_AMOUNT, volume)
             double total_cost = 0
             double total_volume = 0
             double result_vwap = NaN
-        if is_buy:
-            for order_book_row in self.ask_entries():
-                total_cost += order_book_row.amount * order_book_row.price
-                total_volume += order_book_row.amount
-                if total_volume >= volume:
-                    total_cost -= order_book_row.amount * order_book_row.price
-                    total_volume -= order_book_row.amount
-                    incremental_amount = volume - total_volume
-                    total_cost += incremental_amount * order_book_row.price
-                    total_volume += incremental_amount
-                    result_vwap = total_cost / total_volume
-                    break
-        else:
-            for order_book_row in self.bid_entries():
-                total_cost += order_book_row.amount * order_book_row.price
-                total_volume += order_book_row.amount
-                if total_volume >= volume:
-                    total_cost -= order_book_row.amount * order_book_row.price
-                    total_volume -= order_book_row.amount
-                    incremental_amount = volume - total_volume
-                    total_cost += incremental_amount * order_book_row.price
-                    total_volume += incremental_amount
-                    result_vwap = total_cost / total_volume
-                    break
+
+        if level < levels:
+            if level > 0:
+                total_cost = depth[DEPTH_CUMULATIVE_QUOTE, level - 1]
+                total_volume = depth[DEPTH_CUMULATIVE_AMOUNT, level - 1]
+            # Only take the part of the last level needed to complete the volume
+            total_cost += (volume - total_volume) * depth[DEPTH_PRICE, level]
+            total_volume = volume
+            result_vwap = total_cost / total_volume
+        elif levels > 0:
+            total_volume = depth[DEPTH_CUMULATIVE_AMOUNT, levels - 1]
 
         return OrderBookQueryResult(NaN, volume, result_vwap, min(total_volume, volume))
 
     cdef OrderBookQueryResult c_get_price_for_quote_volume(self, bint is_buy, double quote_volume):
         cdef:
+            double[:, ::1] depth = self.c_get_depth_index(is_buy)
+            Py_ssize_t levels = depth.shape[1]
+            Py_ssize_t level = c_first_level_reaching(depth, DEPTH_CUMULATIVE_QUOTE, quote_volume)
             double cumulative_volume = 0
             double result_price = NaN
 
-        if is_buy:
-            for order_book_row in self.ask_entries():
-                cumulative_volume += order_book_row.amount * order_book_row.price
-                if cumulative_volume >= quote_volume:
-                    result_price = order_book_row.price
-                    break
-        else:
-            for order_book_row in self.bid_entries():
-                cumulative_volume += order_book_row.amount * order_book_row.price
-                if cumulative_volume >= quote_volume:
-                    result_price = order_book_row.price
-                    break
+        if level < levels:
+            result_price = depth[DEPTH_PRICE, level]
+            cumulative_volume = depth[DEPTH_CUMULATIVE_QUOTE, level]
+        elif levels > 0:
+            cumulative_volume = depth[DEPTH_CUMULATIVE_QUOTE, levels - 1]
 
         return OrderBookQueryResult(NaN, quote_volume, result_price, min(cumulative_volume, quote_volume))
 
     cdef OrderBookQueryResult c_get_quote_volume_for_base_amount(self, bint is_buy, double base_amount):
         cdef:
+            double[:, ::1] depth = self.c_get_depth_index(is_buy)
+            Py_ssize_t levels = depth.shape[1]
+            Py_ssize_t level = c_first_level_reaching(depth, DEPTH_CUMULATIVE_AMOUNT, base_amount)
             double cumulative_volume = 0
             double cumulative_base_amount = 0
-            double row_amount = 0
-
-        if is_buy:
-            for order_book_row in self.ask_entries():
-                row_amount = order_book_row.amount
-                if row_amount + cumulative_base_amount >= base_amount:
-                    row_amount = base_amount - cumulative_base_amount
-                cumulative_base_amount += row_amount
-                cumulative_volume += row_amount * order_book_row.price
-                if cumulative_base_amount >= base_amount:
-                    break
-        else:
-            for order_book_row in self.bid_entries():
-                row_amount = order_book_row.amount
-                if row_amount + cumulative_base_amount >= base_amount:
-                    row_amount = base_amount - cumulative_base_amount
-                cumulative_base_amount += row_amount
-                cumulative_volume += row_amount * order_book_row.price
-                if cumulative_base_amount >= base_amount:
-                    break
+
+        if level < levels:
+            if level > 0:
+                cumulative_volume = depth[DEPTH_CUMULATIVE_QUOTE, level - 1]
+                cumulative_base_amount = depth[DEPTH_CUMULATIVE_AMOUNT, level - 1]
+            # Only take the part of the last level needed to complete the base amount
+            cumulative_volume += (base_amount - cumulative_base_amount) * depth[DEPTH_PRICE, level]
+        elif levels > 0:
+            cumulative_volume = depth[DEPTH_CUMULATIVE_QUOTE, levels - 1]
 
         return OrderBookQueryResult(NaN, base_amount, NaN, cumulative_volume)
 
     cdef OrderBookQueryResult c_get_volume_for_price(self, bint is_buy, double price):
         cdef:
+            double[:, ::1] depth = self.c_get_depth_index(is_buy)
+            Py_ssize_t levels_within = c_count_levels_within_price(depth, is_buy, price)
             double cumulative_volume = 0
             double result_price = NaN
 
-        if is_buy:
-            for order_book_row in self.ask_entries():
-                if order_book_row.price > price:
-                    break
-                cumulative_volume += order_book_row.amount
-                result_price = order_book_row.price
-        else:
-            for order_book_row in self.bid_entries():
-                if order_book_row.price < price:
-                    break
-                cumulative_volume += order_book_row.amount
-                result_price = order_book_row.price
+        if levels_within > 0:
+            result_price = depth[DEPTH_PRICE, levels_within - 1]
+            cumulative_volume = depth[DEPTH_CUMULATIVE_AMOUNT, levels_within - 1]
 
         return OrderBookQueryResult(price, NaN, result_price, cumulative_volume)
 
     cdef OrderBookQueryResult c_get_quote_volume_for_price(self, bint is_buy, double price):
         cdef:
+            double[:, ::1] depth = self.c_get_depth_index(is_buy)
+            Py_ssize_t levels_within = c_count_levels_within_price(depth, is_buy, price)
             double cumulative_volume = 0
             double result_price = NaN
 
-        if is_buy:
-            for order_book_row in self.ask_entries():
-                if order_book_row.price > price:
-                    break
-                cumulative_volume += order_book_row.amount * order_book_row.price
-                result_price = order_book_row.price
-        else:
-            for order_book_row in self.bid_entries():
-                if order_book_row.price < price:
-                    break
-                cumulative_volume += order_book_row.amount * order_book_row.price
-                result_price = order_book_row.price
+        if levels_within > 0:
+            result_price = depth[DEPTH_PRICE, levels_within - 1]
+            cumulative_volume = depth[DEPTH_CUMULATIVE_QUOTE, levels_within - 1]
 
         return OrderBookQueryResult(price, NaN, result_price, cumulative_volume)
 
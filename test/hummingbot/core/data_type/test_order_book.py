@@ -50,6 +50,93 @@ class OrderBookUnitTest(unittest.TestCase):
         self.assertEqual(best_bid, [50., 0.01, 6.])
         self.assertEqual(best_ask, 0)
 
+    def test_depth_index_layout(self):
+        order_book = OrderBook()
+        bids_array = np.array([[1, 1, 1], [2, 2, 2], [3, 3, 3]], dtype=np.float64)
+        asks_array = np.array([[4, 1, 1], [5, 2, 2], [6, 3, 3]], dtype=np.float64)
+        order_book.apply_numpy_snapshot(bids_array, asks_array)
+
+        bid_depth = order_book.bid_depth_index
+        ask_depth = order_book.ask_depth_index
+        self.assertEqual([[3, 2, 1], [3, 2, 1], [3, 5, 6], [9, 13, 14]], bid_depth.tolist())
+        self.assertEqual([[4, 5, 6], [1, 2, 3], [1, 3, 6], [4, 14, 32]], ask_depth.tolist())
+        self.assertFalse(bid_depth.flags.writeable)
+        self.assertFalse(ask_depth.flags.writeable)
+
+    def test_depth_index_invalidated_on_diffs(self):
+        order_book = OrderBook()
+        bids_array = np.array([[1, 1, 1], [2, 2, 2]], dtype=np.float64)
+        asks_array = np.array([[4, 1, 1], [5, 2, 2]], dtype=np.float64)
+        order_book.apply_numpy_snapshot(bids_array, asks_array)
+        self.assertEqual(3, order_book.get_price_for_volume(True, 2).result_volume)
+        self.assertEqual(5, order_book.get_price_for_volume(True, 2).result_price)
+
+        order_book.apply_numpy_diffs(np.array([[2, 0, 3]], dtype=np.float64),
+                                     np.array([[4, 5, 3]], dtype=np.float64))
+        self.assertEqual([[1], [1], [1], [1]], order_book.bid_depth_index.tolist())
+        self.assertEqual(4, order_book.get_price_for_volume(True, 2).result_price)
+        self.assertEqual(1, order_book.get_price_for_volume(False, 1).result_price)
+
+    def test_depth_queries_match_book_walk(self):
+        rng = np.random.default_rng(42)
+        order_book = OrderBook()
+        bid_prices = 100 - np.arange(1, 51) * 0.1
+        ask_prices = 100 + np.arange(1, 51) * 0.1
+        bids_array = np.column_stack([bid_prices, rng.uniform(0.1, 5, 50), np.ones(50)])
+        asks_array = np.column_stack([ask_prices, rng.uniform(0.1, 5, 50), np.ones(50)])
+        order_book.apply_numpy_snapshot(bids_array, asks_array)
+
+        for is_buy in (True, False):
+            rows = list(order_book.ask_entries() if is_buy else order_book.bid_entries())
+            for volume in (0.05, 1, 7.5, 60, 1000):
+                expected_price, expected_cost, filled = self._walk_for_volume(rows, volume)
+                result = order_book.get_price_for_volume(is_buy, volume)
+                self._assert_same_float(expected_price, result.result_price)
+                self.assertAlmostEqual(filled, result.result_volume)
+
+                result = order_book.get_vwap_for_volume(is_buy, volume)
+                expected_vwap = expected_cost / volume if filled >= volume else float("nan")
+                self._assert_same_float(expected_vwap, result.result_price)
+
+                result = order_book.get_quote_volume_for_base_amount(is_buy, volume)
+                self.assertAlmostEqual(expected_cost, result.result_volume)
+
+            for price in (90, 99.55, 100, 100.45, 110):
+                included = [row for row in rows if (row.price <= price if is_buy else row.price >= price)]
+                result = order_book.get_volume_for_price(is_buy, price)
+                self._assert_same_float(included[-1].price if included else float("nan"), result.result_price)
+                self.assertAlmostEqual(sum(row.amount for row in included), result.result_volume)
+
+                result = order_book.get_quote_volume_for_price(is_buy, price)
+                self.assertAlmostEqual(sum(row.amount * row.price for row in included), result.result_volume)
+
+    def test_depth_queries_on_empty_book(self):
+        order_book = OrderBook()
+        self.assertEqual((4, 0), order_book.bid_depth_index.shape)
+        result = order_book.get_price_for_volume(True, 1)
+        self.assertTrue(np.isnan(result.result_price))
+        self.assertEqual(0, result.result_volume)
+        self.assertEqual(0, order_book.get_quote_volume_for_base_amount(False, 1).result_volume)
+        self.assertEqual(0, order_book.get_volume_for_price(False, 1).result_volume)
+
+    @staticmethod
+    def _walk_for_volume(rows, volume):
+        cumulative_amount = 0
+        cost = 0
+        for row in rows:
+            taken = min(row.amount, volume - cumulative_amount)
+            cumulative_amount += row.amount
+            cost += taken * row.price
+            if cumulative_amount >= volume:
+                return row.price, cost, volume
+        return float("nan"), cost, cumulative_amount
+
+    def _assert_same_float(self, expected, actual):
+        if np.isnan(expected):
+            self.assertTrue(np.isnan(actual))
+        else:
+            self.assertAlmostEqual(expected, actual)
+
 
 def main():
     logging.basicConfig(level=logging.INFO)